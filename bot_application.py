@@ -0,0 +1,71 @@
+import asyncio
+import httpx
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram.request import HTTPXRequest
+from handlers import TRIGGER_RE, start, handle_message
+
+# Outbound connection pool to api.telegram.org. Requests are multiplexed over
+# HTTP/2, so bursts of sends share a few connections instead of opening one each.
+CONNECTION_POOL_SIZE = 32
+KEEPALIVE_EXPIRY = 60.0
+
+# Webhook updates are handled concurrently as background tasks, at most this
+# many at once
+MAX_CONCURRENT_UPDATES = 64
+# Updates allowed to wait on top of that. The webhook answers 429 once this
+# many are waiting for a slot. In polling mode updates are handled one at a
+# time, so this is how many can sit in the update queue; once it is full the
+# updater stops fetching and Telegram keeps the rest until there is room.
+UPDATE_QUEUE_SIZE = 1024
+
+class KeepAliveHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that keeps idle connections to Telegram open for longer.
+
+    httpx closes pooled connections after 5 seconds idle, so replies sent a
+    few seconds apart would each pay for a fresh TCP + TLS handshake.
+    """
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self._client_kwargs["limits"]
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        return super()._build_client()
+
+def build_request() -> KeepAliveHTTPXRequest:
+    """Create the HTTP client used for Bot API calls."""
+    return KeepAliveHTTPXRequest(
+        connection_pool_size=CONNECTION_POOL_SIZE,
+        pool_timeout=5.0,
+        connect_timeout=5.0,
+        read_timeout=10.0,
+        http_version="2",
+    )
+
+def build_application(token: str, polling: bool = False) -> Application:
+    """Build the bot application with the handlers shared by every run mode."""
+    builder = (
+        Application.builder()
+        .token(token)
+        .request(build_request())
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+    )
+    if polling:
+        # PTB's update fetcher spawns a task per queued update before that
+        # task waits for a concurrency slot, so concurrent dispatch would
+        # leave the number of tasks unbounded. Processing updates one at a
+        # time makes the fetcher drain the queue only as fast as it handles.
+        builder = builder.get_updates_request(build_request())
+    else:
+        # The webhook bounds in-flight tasks itself (see TelegramWebhook) and
+        # runs them through this processor's MAX_CONCURRENT_UPDATES slots
+        builder = builder.concurrent_updates(MAX_CONCURRENT_UPDATES)
+    application = builder.build()
+    
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Regex(TRIGGER_RE), handle_message)
+    )
+    return application
@@ -0,0 +1,72 @@
+import logging
+import re
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Trigger words for handle_message
+_KASM = "كسمك"
+_HARF = "حرفوش"
+
+# Messages shorter than the shortest trigger word can never match
+MIN_TRIGGER_LEN = min(len(_KASM), len(_HARF))
+
+# All triggers fused into one regex so a message is scanned once. The first
+# alternative only matches when it is the whole message. It is also used as
+# the handler filter, whose match PTB hands to handle_message.
+TRIGGER_RE = re.compile(rf"\A{re.escape(_KASM)}\Z|{re.escape(_HARF)}")
+TRIGGER_REPLIES = {
+    _KASM: "الله يسامحك",
+    _HARF: "حرفوش عمك",
+}
+
+# /start reply, built once; only the user's first name and chat ID vary.
+_START_TEMPLATE = (
+    "<b>👋 Welcome to UniShark Bot, {first_name}!</b> 🦈\n\n"
+    "I'm here to help you stay on top of your university tasks. Here is your unique ID to connect me to your account:\n\n"
+    "🔑 <b>Your Personal Chat ID is:</b> <code>{chat_id}</code>\n\n"
+    "<b>Action Required:</b>\n"
+    "1️⃣ Copy the Chat ID above.\n"
+    "2️⃣ Go to your UniShark settings page.\n"
+    "3️⃣ Paste the ID into the 'Telegram Chat ID' field.\n\n"
+    "Once connected, I'll send you instant notifications for:\n"
+    "- 📝 New Assignments\n"
+    "- ❓ New Quizzes\n"
+    "- ⏰ Approaching Deadlines\n\n"
+    "Good luck with your studies! 🎓"
+)
+
+# Telegram objects are immutable, so one keyboard can be shared by all replies
+_START_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("Go to UniShark Website", url="https://unishark.site")]]
+)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends a message when the command /start is issued."""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
+    
+    logger.info("User %s (ID: %s) started the bot. Chat ID: %s", user.full_name, user.id, chat_id)
+    
+    message = _START_TEMPLATE.format(first_name=user.first_name, chat_id=chat_id)
+    
+    await update.message.reply_html(
+        message,
+        reply_markup=_START_KEYBOARD,
+        disable_web_page_preview=True,
+    )
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle regular text messages."""
+    message = update.message
+    if message is None or not message.text:
+        return
+    message_text = message.text
+    if len(message_text) < MIN_TRIGGER_LEN:
+        return
+    
+    # Reuse the match from the Regex filter instead of scanning again
+    match = context.matches[0] if context.matches else TRIGGER_RE.search(message_text)
+    if match:
+        await message.reply_text(TRIGGER_REPLIES[match.group(0)])
@@ -1,116 +1,144 @@
 import os
+import atexit
 import logging
+import logging.handlers
+import queue
 import asyncio
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import gc
+import hashlib
+import hmac
+import importlib
+import orjson
 from dotenv import load_dotenv
+import aiohttp
 from aiohttp import web
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Enable logging
+# Enable logging. Records are queued and written by a background thread, so
+# a slow log collector on stderr never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+)
+# Only the message is rendered on the caller's side; the listener adds the
+# timestamp and the rest of the format on its own thread
+_log_enqueue = logging.handlers.QueueHandler(_log_queue)
+_log_enqueue.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[_log_enqueue],
     level=logging.INFO,
     force=True
 )
-# Force output to stdout/stderr immediately (no buffering)
-logging.getLogger().handlers[0].flush = lambda: None
+log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+log_listener.start()
+# Drain queued records on exit, including the final error when startup fails
+atexit.register(log_listener.stop)
+# Skip collecting record fields the format above never prints
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 PORT = int(os.getenv("PORT", 8000))
+# Idle keep-alive for inbound connections, matching nginx's default upstream timeout
+KEEPALIVE_TIMEOUT = 75
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Sends a message when the command /start is issued."""
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    logger.info(f"User {user.full_name} (ID: {user.id}) started the bot. Chat ID: {chat_id}")
-    
-    message = (
-        f"<b>👋 Welcome to UniShark Bot, {user.first_name}!</b> 🦈\n\n"
-        "I'm here to help you stay on top of your university tasks. Here is your unique ID to connect me to your account:\n\n"
-        f"🔑 <b>Your Personal Chat ID is:</b> <code>{chat_id}</code>\n\n"
-        "<b>Action Required:</b>\n"
-        "1️⃣ Copy the Chat ID above.\n"
-        "2️⃣ Go to your UniShark settings page.\n"
-        "3️⃣ Paste the ID into the 'Telegram Chat ID' field.\n\n"
-        "Once connected, I'll send you instant notifications for:\n"
-        "- 📝 New Assignments\n"
-        "- ❓ New Quizzes\n"
-        "- ⏰ Approaching Deadlines\n\n"
-        "Good luck with your studies! 🎓"
-    )
-    
-    keyboard = [
-        [InlineKeyboardButton("Go to UniShark Website", url="https://unishark.site")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_html(
-        message,
-        reply_markup=reply_markup,
-        disable_web_page_preview=True,
-    )
-
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle regular text messages."""
-    message_text = update.message.text
-    
-    if message_text == "كسمك":
-        await update.message.reply_text("الله يسامحك")
-    elif "حرفوش" in message_text:
-        await update.message.reply_text("حرفوش عمك")
+# Telegram proves it is Telegram by echoing the secret in the
+# X-Telegram-Bot-Api-Secret-Token header, so the bot token never appears in
+# the URL. WEBHOOK_SECRET may only contain A-Z, a-z, 0-9, _ and -; by default
+# it is derived from the bot token so it is stable across restarts.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or (
+    hashlib.sha256(TELEGRAM_BOT_TOKEN.encode()).hexdigest() if TELEGRAM_BOT_TOKEN else None
+)
+# Telegram never reports the secret back, so a short fingerprint of it goes
+# into the path: rotating the secret changes the registered URL.
+WEBHOOK_PATH = (
+    "/tg/" + hashlib.sha256(WEBHOOK_SECRET.encode()).hexdigest()[:8] if WEBHOOK_SECRET else "/tg"
+)
+WEBHOOK_ENDPOINT = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH if WEBHOOK_URL else None
+
+# Health check response body and headers, shared by every probe
+_OK_BYTES = b'OK\n'
+_OK_HEADERS = {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'}
 
 async def health_check(request):
     """Health check endpoint for Choreo"""
     logger.debug("Health check pinged")
-    return web.Response(text='OK\n', status=200)
+    return web.Response(body=_OK_BYTES, headers=_OK_HEADERS)
+
+class TelegramWebhook:
+    """aiohttp handler for Telegram webhook POST requests.
+
+    This does exactly what PTB's own webhook handler does (decode, de_json,
+    dispatch), but PTB's server is Tornado-based and cannot also serve /health
+    on the single port Choreo probes, so we keep it on aiohttp.
+
+    Until attach() is called with a started application, deliveries get a 503
+    and Telegram redelivers them later. Once max_pending updates are in
+    flight, further deliveries get a 429 so a flood cannot pile up tasks.
+    """
+
+    def __init__(self):
+        self.application = None
+        self._de_json = None
+        self._pending = None
+
+    def attach(self, application, max_pending: int) -> None:
+        """Hand updates to application, with at most max_pending in flight."""
+        from telegram import Update
+        self._de_json = Update.de_json
+        self._pending = asyncio.Semaphore(max_pending)
+        self.application = application
+
+    async def handle(self, request):
+        """Handle Telegram webhook POST requests"""
+        secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET.encode()):
+            return web.Response(status=401)
+        application = self.application
+        if application is None or not application.running:
+            return web.Response(status=503)
+        try:
+            data = orjson.loads(await request.read())
+            update = self._de_json(data, application.bot)
+        except Exception as e:
+            logger.error("Error processing webhook: %s", e, exc_info=True)
+            return web.Response(status=500)
+        
+        # Take a slot before creating the task, so the number of live tasks
+        # is bounded and not just the number of handlers running. The task
+        # waits for one of the application's MAX_CONCURRENT_UPDATES slots.
+        if self._pending.locked():
+            # Telegram backs off and redelivers the update later
+            logger.warning("Too many pending updates, rejecting update %s", update.update_id)
+            return web.Response(status=429)
+        await self._pending.acquire()  # never waits, a slot is free
+        task = application.create_task(
+            application.update_processor.process_update(update, application.process_update(update)),
+            update=update,
+        )
+        task.add_done_callback(lambda _: self._pending.release())
+        logger.debug("Update dispatched: %s", update.update_id)
+        return web.Response(status=200)
 
 async def run_bot_with_health_check():
     """Run bot with webhook and health check on single port"""
-    logger.info(f"Initializing bot on port {PORT}...")
-    logger.info(f"Token configured: {TELEGRAM_BOT_TOKEN[:10]}...")
-    logger.info(f"Webhook URL: {WEBHOOK_URL}")
-    
-    # Create application
-    try:
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-    except Exception as e:
-        logger.error(f"Failed to create application: {e}", exc_info=True)
-        raise
+    logger.info("Initializing bot on port %s...", PORT)
+    logger.info("Token configured: %s...", TELEGRAM_BOT_TOKEN[:10])
+    logger.info("Webhook URL: %s", WEBHOOK_URL)
     
-    # Add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    
-    # Initialize the application
-    try:
-        await application.initialize()
-        await application.start()
-        logger.info("Application initialized and started successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize application: {e}", exc_info=True)
-        raise
-    
-    # Set up webhook
-    webhook_path = f"/{TELEGRAM_BOT_TOKEN}"
-    webhook_url = WEBHOOK_URL + TELEGRAM_BOT_TOKEN
-    
-    logger.info(f"Setting webhook to: {webhook_url}")
-    try:
-        await application.bot.set_webhook(
-            url=webhook_url,
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True
-        )
-        logger.info("Webhook set successfully")
-    except Exception as e:
-        logger.error(f"Failed to set webhook: {e}", exc_info=True)
-        raise
+    # Created after the web server is up
+    application = None
     
     # Create web app with routes
     web_app = web.Application()
@@ -120,74 +148,127 @@ async def run_bot_with_health_check():
     web_app.router.add_get('/health', health_check)
     
     # Webhook endpoint - handle Telegram updates
-    async def telegram_webhook(request):
-        """Handle Telegram webhook POST requests"""
-        try:
-            logger.info("Received webhook POST request")
-            data = await request.json()
-            update = Update.de_json(data, application.bot)
-            await application.update_queue.put(update)
-            logger.info(f"Update queued successfully: {update.update_id}")
-            return web.Response(status=200)
-        except Exception as e:
-            logger.error(f"Error processing webhook: {e}", exc_info=True)
-            return web.Response(status=500)
-    
-    web_app.router.add_post(webhook_path, telegram_webhook)
+    webhook = TelegramWebhook()
+    web_app.router.add_post(WEBHOOK_PATH, webhook.handle)
     
-    # Start web server
+    # Start the web server first so /health answers while the Telegram
+    # stack is still being imported and initialized
     try:
-        runner = web.AppRunner(web_app)
+        runner = web.AppRunner(web_app, keepalive_timeout=KEEPALIVE_TIMEOUT)
         await runner.setup()
         site = web.TCPSite(runner, '0.0.0.0', PORT)
         await site.start()
-        logger.info(f"Web server started on 0.0.0.0:{PORT}")
+        logger.info("Web server started on 0.0.0.0:%s", PORT)
     except Exception as e:
-        logger.error(f"Failed to start web server: {e}", exc_info=True)
+        logger.error("Failed to start web server: %s", e, exc_info=True)
         raise
     
-    logger.info(f"✅ Bot is running!")
-    logger.info(f"   - Webhook: {webhook_url}")
-    logger.info(f"   - Health check: http://0.0.0.0:{PORT}/health")
-    logger.info(f"   - Listening on: 0.0.0.0:{PORT}")
-    logger.info("Bot will stay alive indefinitely. Press Ctrl+C to stop.")
-    
-    # Log a heartbeat every 5 minutes to confirm bot is still alive
-    async def heartbeat():
-        while True:
-            await asyncio.sleep(300)  # 5 minutes
-            logger.info("💓 Heartbeat: Bot is still running")
-            # Ping ourselves to prevent idle timeout
-            try:
-                import aiohttp
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f'http://localhost:{PORT}/health', timeout=5) as resp:
+    heartbeat_task = None
+    ping_session = None
+    try:
+        # Import the Telegram stack off the event loop so /health keeps
+        # answering while it loads
+        await asyncio.to_thread(importlib.import_module, "bot_application")
+        from telegram import Update
+        from bot_application import MAX_CONCURRENT_UPDATES, UPDATE_QUEUE_SIZE, build_application
+        
+        # Create application
+        try:
+            application = build_application(TELEGRAM_BOT_TOKEN)
+        except Exception as e:
+            logger.error("Failed to create application: %s", e, exc_info=True)
+            raise
+        
+        # Initialize the application
+        try:
+            await application.initialize()
+            await application.start()
+            logger.info("Application initialized and started successfully")
+        except Exception as e:
+            logger.error("Failed to initialize application: %s", e, exc_info=True)
+            raise
+        
+        webhook.attach(application, MAX_CONCURRENT_UPDATES + UPDATE_QUEUE_SIZE)
+        
+        # Set up webhook, unless Telegram already has this configuration.
+        # The URL includes a fingerprint of WEBHOOK_SECRET, so a rotated
+        # secret also shows up as a changed URL.
+        try:
+            info = await application.bot.get_webhook_info()
+            if (
+                info.url != WEBHOOK_ENDPOINT
+                or set(info.allowed_updates or ()) != set(Update.ALL_TYPES)
+            ):
+                logger.info("Setting webhook to: %s", WEBHOOK_ENDPOINT)
+                await application.bot.set_webhook(
+                    url=WEBHOOK_ENDPOINT,
+                    allowed_updates=Update.ALL_TYPES,
+                    secret_token=WEBHOOK_SECRET,
+                )
+                logger.info("Webhook set successfully")
+            else:
+                logger.info("Webhook already set to: %s", WEBHOOK_ENDPOINT)
+        except Exception as e:
+            logger.error("Failed to set webhook: %s", e, exc_info=True)
+            raise
+        
+        logger.info("✅ Bot is running!")
+        logger.info("   - Webhook: %s", WEBHOOK_ENDPOINT)
+        logger.info("   - Health check: http://0.0.0.0:%s/health", PORT)
+        logger.info("   - Listening on: 0.0.0.0:%s", PORT)
+        logger.info("Bot will stay alive indefinitely. Press Ctrl+C to stop.")
+        
+        # One session for every self-ping; localhost never changes, so its
+        # DNS lookup is cached for the life of the process
+        ping_url = f'http://localhost:{PORT}/health'
+        ping_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=1, ttl_dns_cache=None),
+            timeout=aiohttp.ClientTimeout(total=5),
+        )
+        
+        # Log a heartbeat every 5 minutes to confirm bot is still alive
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(300)  # 5 minutes
+                logger.info("💓 Heartbeat: Bot is still running")
+                # Ping ourselves to prevent idle timeout
+                try:
+                    async with ping_session.get(ping_url) as resp:
                         if resp.status == 200:
                             logger.debug("Self-ping successful")
-            except Exception as e:
-                logger.warning(f"Self-ping failed: {e}")
-    
-    heartbeat_task = asyncio.create_task(heartbeat())
-    
-    # Keep the application running to process updates from the queue
-    try:
+                except Exception as e:
+                    logger.warning("Self-ping failed: %s", e)
+        
+        heartbeat_task = asyncio.create_task(heartbeat())
+        
+        # Move everything allocated during startup out of the GC's reach so
+        # collections triggered by per-update allocations only scan new objects.
+        # Collect first, or startup garbage would be frozen in for good.
+        gc.collect()
+        gc.freeze()
+        
+        # Keep the application running to process updates from the queue
         await asyncio.Event().wait()
     finally:
-        heartbeat_task.cancel()
-        await application.stop()
-        await application.shutdown()
+        if heartbeat_task:
+            heartbeat_task.cancel()
+        if ping_session:
+            await ping_session.close()
+        if application is not None:
+            if application.running:
+                await application.stop()
+            await application.shutdown()
         await runner.cleanup()
 
 async def run_bot_polling():
     """Run bot with polling for local testing"""
     logger.info("Starting bot in polling mode (local testing)...")
     
-    # Create application
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    from telegram import Update
+    from bot_application import build_application
     
-    # Add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Create application
+    application = build_application(TELEGRAM_BOT_TOKEN, polling=True)
     
     # Delete webhook to enable polling
     await application.bot.delete_webhook(drop_pending_updates=True)
@@ -200,6 +281,9 @@ async def run_bot_polling():
     
     logger.info("✅ Bot is running in polling mode!")
     
+    gc.collect()
+    gc.freeze()
+    
     try:
         await asyncio.Event().wait()
     finally:
@@ -207,17 +291,23 @@ async def run_bot_polling():
         await application.stop()
         await application.shutdown()
 
+def run_async(coro) -> None:
+    """Run a coroutine on uvloop when available, else the default asyncio loop."""
+    loop_factory = uvloop.new_event_loop if uvloop else None
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(coro)
+
 def main() -> None:
     """Start the bot."""
     logger.info("=== UniShark Telegram Bot Starting ===")
-    logger.info(f"Python version: {os.sys.version}")
-    logger.info(f"PORT: {PORT}")
+    logger.info("Python version: %s", os.sys.version)
+    logger.info("PORT: %s", PORT)
     
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN is not set. The bot cannot start.")
         return
     
-    logger.info(f"Token present: {TELEGRAM_BOT_TOKEN[:10]}...{TELEGRAM_BOT_TOKEN[-4:]}")
+    logger.info("Token present: %s...%s", TELEGRAM_BOT_TOKEN[:10], TELEGRAM_BOT_TOKEN[-4:])
     
     # Check if running locally (no valid webhook URL or localhost)
     is_local = not WEBHOOK_URL or "localhost" in WEBHOOK_URL or "127.0.0.1" in WEBHOOK_URL
@@ -225,18 +315,18 @@ def main() -> None:
     if is_local:
         logger.info("Local environment detected - using polling mode")
     else:
-        logger.info(f"Production environment detected - using webhook mode")
-        logger.info(f"WEBHOOK_URL: {WEBHOOK_URL}")
+        logger.info("Production environment detected - using webhook mode")
+        logger.info("WEBHOOK_URL: %s", WEBHOOK_URL)
     
     try:
         if is_local:
-            asyncio.run(run_bot_polling())
+            run_async(run_bot_polling())
         else:
-            asyncio.run(run_bot_with_health_check())
+            run_async(run_bot_with_health_check())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
+        logger.error("Fatal error: %s", e, exc_info=True)
         raise  # Re-raise to show full error in logs
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Bot
+from telegram.ext import SimpleUpdateProcessor
+
+import telegram_bot
+
+SECRET = "test-secret"
+
+
+class BlockedApplication:
+    """Stand-in for a started Application whose handlers block until released."""
+
+    running = True
+
+    def __init__(self, max_concurrent_updates):
+        self.bot = Bot("123:abc")
+        self.update_processor = SimpleUpdateProcessor(max_concurrent_updates)
+        self.release = asyncio.Event()
+        self.processed = 0
+        self.tasks_created = 0
+
+    async def process_update(self, update):
+        await self.release.wait()
+        self.processed += 1
+
+    def create_task(self, coroutine, update=None):
+        self.tasks_created += 1
+        return asyncio.create_task(coroutine)
+
+
+def make_client(webhook):
+    web_app = web.Application()
+    web_app.router.add_post(telegram_bot.WEBHOOK_PATH, webhook.handle)
+    return TestClient(TestServer(web_app))
+
+
+async def post_updates(client, first, count):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    responses = await asyncio.gather(
+        *(
+            client.post(telegram_bot.WEBHOOK_PATH, json={"update_id": update_id}, headers=headers)
+            for update_id in range(first, first + count)
+        )
+    )
+    return [response.status for response in responses]
+
+
+def test_webhook_flood_is_rejected_with_429(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "WEBHOOK_SECRET", SECRET)
+
+    async def scenario():
+        application = BlockedApplication(max_concurrent_updates=2)
+        webhook = telegram_bot.TelegramWebhook()
+        webhook.attach(application, max_pending=5)
+
+        async with make_client(webhook) as client:
+            statuses = await post_updates(client, 0, 50)
+            assert statuses.count(200) == 5
+            assert statuses.count(429) == 45
+
+            application.release.set()
+            for _ in range(100):
+                if application.processed == 5:
+                    break
+                await asyncio.sleep(0.01)
+            assert application.processed == 5
+
+            # Slots are released once updates finish processing
+            assert await post_updates(client, 50, 5) == [200] * 5
+
+    asyncio.run(scenario())
+
+
+
+def test_webhook_rejects_missing_or_wrong_secret(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "WEBHOOK_SECRET", SECRET)
+
+    async def scenario():
+        application = BlockedApplication(max_concurrent_updates=2)
+        webhook = telegram_bot.TelegramWebhook()
+        webhook.attach(application, max_pending=5)
+
+        async with make_client(webhook) as client:
+            for headers in ({}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}):
+                response = await client.post(
+                    telegram_bot.WEBHOOK_PATH, json={"update_id": 1}, headers=headers
+                )
+                assert response.status == 401
+        assert application.tasks_created == 0
+
+    asyncio.run(scenario())
+
+
+def test_webhook_answers_503_before_attach(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "WEBHOOK_SECRET", SECRET)
+
+    async def scenario():
+        async with make_client(telegram_bot.TelegramWebhook()) as client:
+            assert await post_updates(client, 0, 1) == [503]
+
+    asyncio.run(scenario())